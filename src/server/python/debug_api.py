@@ -7,7 +7,8 @@ import json
 import os
 import sys
 import tempfile
-from dna_optimization import optimize_sequence
+import shutil
+from dna_optimization import optimize_sequence, create_constraint
 
 # Simple test sequence
 TEST_SEQUENCE = "ATGCAGTACGTAGCTGATCGATGCTAGCGTAGCTGATCGTGCTAGTCAGTCGATGCTATGCTGATGCTAGTCGATGCATGCGTAGCATGCGTAGCTAGCTAGCGATGCTA"
@@ -149,6 +150,202 @@ def test_combined_constraints():
         print(f"Objectives summary: {result['objectives_summary']}")
     return result['success']
 
+def _cache_entries(cache_dir):
+    """List the mutation space cache files in a directory"""
+    return [f for f in os.listdir(cache_dir) if f.endswith(".npz")]
+
+def _fail_on_recompute(*args, **kwargs):
+    """Stand-in for _compute_region_choices on runs which must hit the cache"""
+    raise RuntimeError("CDS mutation space was recomputed instead of loaded from the cache")
+
+def test_cached_cds_optimization():
+    """Test that a repeated CDS optimization reuses the cached mutation space"""
+    print("\n=== Testing Cached CDS Mutation Space ===")
+    from Bio.Seq import Seq
+    cds_location = [0, 108]
+    constraints = [
+        {
+            "type": "EnforceTranslation",
+            "location": cds_location
+        },
+        {
+            "type": "AvoidRareCodons",
+            "species": "e_coli",
+            "min_frequency": 0.1,
+            "location": cds_location
+        }
+    ]
+    objectives = [
+        {
+            "type": "CodonOptimize",
+            "species": "e_coli",
+            "location": cds_location
+        }
+    ]
+    import mutation_space_cache
+    protein = str(Seq(TEST_SEQUENCE[:108]).translate())
+    success = True
+
+    # Use a private cache so runs neither read nor fill the shared one
+    original_cache_dir = mutation_space_cache.CACHE_DIR
+    original_compute = mutation_space_cache._compute_region_choices
+    mutation_space_cache.CACHE_DIR = tempfile.mkdtemp()
+    try:
+        for run in range(2):
+            if run == 1:
+                # The second run must load the CDS mutation space from the cache
+                mutation_space_cache._compute_region_choices = _fail_on_recompute
+            result = optimize_sequence(
+                sequence=TEST_SEQUENCE,
+                constraints=constraints,
+                objectives=objectives,
+                is_circular=False
+            )
+            print(f"Run {run + 1} success: {result['success']}")
+            if not result['success']:
+                print(f"Error: {result.get('error')}")
+                print(f"Traceback: {result.get('traceback')}")
+                return False
+            entries = len(_cache_entries(mutation_space_cache.CACHE_DIR))
+            print(f"Run {run + 1} cache entries: {entries}")
+            optimized_protein = str(Seq(result['optimized_sequence'][:108]).translate())
+            success = success and entries == 1 and optimized_protein == protein
+    finally:
+        mutation_space_cache._compute_region_choices = original_compute
+        shutil.rmtree(mutation_space_cache.CACHE_DIR, ignore_errors=True)
+        mutation_space_cache.CACHE_DIR = original_cache_dir
+    print(f"Cache hit and translation preserved: {success}")
+    return success
+
+def test_mutation_space_cache():
+    """Test that cached mutation spaces match the ones DNAChisel computes"""
+    print("\n=== Testing Mutation Space Cache ===")
+    import io
+    import numpy as np
+    from dnachisel import DnaOptimizationProblem
+    import mutation_space_cache
+
+    def choices_summary(space):
+        return [(c.start, c.end, sorted(c.variants)) for c in space.choices_list]
+
+    rare_codons = {"type": "AvoidRareCodons", "species": "e_coli", "min_frequency": 0.1}
+    # (name, constraints, number of CDS specs expected to bypass the cache)
+    cases = [
+        ("forward", [
+            {"type": "EnforceTranslation", "location": [0, 108]},
+            dict(rare_codons, location=[0, 108])
+        ], 0),
+        ("reverse strand", [
+            {"type": "EnforceTranslation", "location": [0, 108, -1]},
+            dict(rare_codons, location=[0, 108, -1])
+        ], 0),
+        ("ragged location", [
+            {"type": "EnforceTranslation", "location": [0, 99]},
+            dict(rare_codons, location=[0, 101])
+        ], 1),
+        ("mixed constraints", [
+            {"type": "EnforceTranslation", "location": [0, 108]},
+            dict(rare_codons, location=[0, 108]),
+            {"type": "AvoidChanges", "location": [10, 20]},
+            {"type": "AvoidPattern", "pattern": "BsaI_site"},
+            {"type": "EnforceGCContent", "mini": 0.3, "maxi": 0.7, "window": 50}
+        ], 0),
+    ]
+
+    original_cache_dir = mutation_space_cache.CACHE_DIR
+    original_compute = mutation_space_cache._compute_region_choices
+    mutation_space_cache.CACHE_DIR = tempfile.mkdtemp()
+    success = True
+    try:
+        for name, constraints, expected_uncached in cases:
+            # Start each case from an empty cache so the first run is a miss
+            for filename in os.listdir(mutation_space_cache.CACHE_DIR):
+                os.unlink(os.path.join(mutation_space_cache.CACHE_DIR, filename))
+            expected = choices_summary(DnaOptimizationProblem(
+                TEST_SEQUENCE, [create_constraint(c) for c in constraints], logger=None
+            ).mutation_space)
+            for run in ("miss", "hit"):
+                if run == "hit":
+                    # A hit must not recompute any cached region
+                    mutation_space_cache._compute_region_choices = _fail_on_recompute
+                try:
+                    problem = mutation_space_cache.create_cached_problem(
+                        TEST_SEQUENCE, [create_constraint(c) for c in constraints], []
+                    )
+                finally:
+                    mutation_space_cache._compute_region_choices = original_compute
+                matches = choices_summary(problem.mutation_space) == expected
+                entries = len(_cache_entries(mutation_space_cache.CACHE_DIR))
+                _, others = mutation_space_cache._group_cds_constraints(problem.constraints)
+                uncached = sum(
+                    isinstance(c, mutation_space_cache.CDS_SPEC_TYPES) for c in others
+                )
+                print(
+                    f"{name} ({run}): space matches: {matches}, "
+                    f"cache entries: {entries}, uncached CDS specs: {uncached}"
+                )
+                success = (
+                    success and matches and entries == 1
+                    and uncached == expected_uncached
+                )
+
+            # Round-trip the choices through the on-disk format
+            choices = choices_summary(problem.mutation_space)
+            buffer = io.BytesIO()
+            np.savez_compressed(buffer, **mutation_space_cache.encode_choices(choices))
+            buffer.seek(0)
+            with np.load(buffer) as data:
+                decoded = mutation_space_cache.decode_choices(dict(data))
+            round_trip = decoded == choices
+            print(f"{name}: encode/decode round-trip: {round_trip}")
+            success = success and round_trip
+
+        # Corrupted entries must be treated as misses and recomputed
+        constraints = cases[0][1]
+        expected = choices_summary(DnaOptimizationProblem(
+            TEST_SEQUENCE, [create_constraint(c) for c in constraints], logger=None
+        ).mutation_space)
+        choices = [(0, 3, ["ATG"]), (3, 6, ["GCA", "GCC"])]
+        corrupted_entries = [
+            ("truncated buffer", dict(
+                mutation_space_cache.encode_choices(choices),
+                variants=np.frombuffer(b"ATGGCAGC", dtype=np.uint8)
+            )),
+            ("non-ACGT variants", mutation_space_cache.encode_choices(
+                [(0, 3, ["ATG"]), (3, 6, ["GCA", "GCN"])]
+            )),
+            ("segment outside region", mutation_space_cache.encode_choices(
+                [(105, 111, ["ATGATG"])]
+            )),
+        ]
+        for name, arrays in corrupted_entries:
+            for filename in _cache_entries(mutation_space_cache.CACHE_DIR):
+                os.unlink(os.path.join(mutation_space_cache.CACHE_DIR, filename))
+            mutation_space_cache.create_cached_problem(
+                TEST_SEQUENCE, [create_constraint(c) for c in constraints], []
+            )
+            path = os.path.join(
+                mutation_space_cache.CACHE_DIR,
+                _cache_entries(mutation_space_cache.CACHE_DIR)[0]
+            )
+            with open(path, 'wb') as f:
+                np.savez_compressed(f, **arrays)
+            problem = mutation_space_cache.create_cached_problem(
+                TEST_SEQUENCE, [create_constraint(c) for c in constraints], []
+            )
+            matches = choices_summary(problem.mutation_space) == expected
+            print(f"{name}: rejected and recomputed: {matches}")
+            success = success and matches
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        success = False
+    finally:
+        mutation_space_cache._compute_region_choices = original_compute
+        shutil.rmtree(mutation_space_cache.CACHE_DIR, ignore_errors=True)
+        mutation_space_cache.CACHE_DIR = original_cache_dir
+    print(f"Mutation space cache checks passed: {success}")
+    return success
+
 if __name__ == "__main__":
     print("Running DNA Chisel debug tests...")
     
@@ -158,5 +355,7 @@ if __name__ == "__main__":
     test_codon_optimize()
     test_avoid_pattern()
     test_combined_constraints()
+    test_cached_cds_optimization()
+    test_mutation_space_cache()
     
     print("\nAll tests completed.") 
\ No newline at end of file
@@ -21,6 +21,7 @@ try:
         AvoidChanges, AvoidMatches, EnforcePatternOccurence, 
         AvoidHairpins, EnforceTerminalGCContent, AvoidRareCodons
     )
+    from mutation_space_cache import create_cached_problem, has_cds_constraints
 except ImportError:
     print("WARNING: DNAChisel is not installed. Using fallback mode.")
     print("For full functionality, install DNAChisel using:")
@@ -231,6 +232,13 @@ def optimize_sequence(
                 constraints=constraint_objects,
                 objectives=objective_objects
             )
+        elif has_cds_constraints(constraint_objects):
+            # Reuse the CDS mutation space computed by previous runs
+            problem = create_cached_problem(
+                sequence=sequence,
+                constraints=constraint_objects,
+                objectives=objective_objects
+            )
         else:
             problem = DnaOptimizationProblem(
                 sequence=sequence,
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Cache for the per-codon mutation space of CDS regions
+
+Building a DnaOptimizationProblem makes DNAChisel merge the codon choices of
+every EnforceTranslation / AvoidRareCodons spec into a MutationSpace. For a
+given CDS this only depends on the region sequence, the translation and the
+codon usage table, so the merged choices are stored on disk as flat numpy
+arrays and reloaded when the same CDS is optimized again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from dnachisel import DnaOptimizationProblem, EnforceTranslation, AvoidRareCodons
+from dnachisel.MutationSpace import MutationSpace, MutationChoice
+
+# Bump when the on-disk layout or the key contents change
+CACHE_FORMAT_VERSION = 1
+
+CACHE_DIR = os.environ.get(
+    "DNA_OPTIMIZATION_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "recombyne_mutation_space_cache")
+)
+
+DEFAULT_CACHE_MAX_MB = 256
+
+def _read_cache_max_bytes() -> int:
+    """Read the cache size limit, falling back to the default on bad input"""
+    value = os.environ.get("DNA_OPTIMIZATION_CACHE_MAX_MB", str(DEFAULT_CACHE_MAX_MB))
+    try:
+        max_mb = float(value)
+        if not max_mb >= 0:
+            raise ValueError("must be a non-negative number")
+    except ValueError:
+        print(f"Warning: Invalid DNA_OPTIMIZATION_CACHE_MAX_MB '{value}', using {DEFAULT_CACHE_MAX_MB}")
+        max_mb = DEFAULT_CACHE_MAX_MB
+    return int(max_mb * 1024 * 1024)
+
+# Least recently used files are evicted once the cache grows past this size
+CACHE_MAX_BYTES = _read_cache_max_bytes()
+
+# Specifications whose nucleotide restrictions are cached per CDS region
+CDS_SPEC_TYPES = (EnforceTranslation, AvoidRareCodons)
+
+def _spec_key_data(spec) -> Dict[str, Any]:
+    """Return the parameters of a CDS spec which determine its restrictions"""
+    if isinstance(spec, EnforceTranslation):
+        return {
+            "type": "EnforceTranslation",
+            "translation": spec.translation,
+            "genetic_table": repr(spec.genetic_table),
+            "start_codon": repr(spec.start_codon),
+        }
+    return {
+        "type": "AvoidRareCodons",
+        "species": spec.species,
+        "min_frequency": spec.min_frequency,
+        "nonrare_codons": list(spec.nonrare_codons),
+    }
+
+def region_cache_key(sequence: str, region: Tuple[int, int, int], specs: List[Any]) -> str:
+    """Return the cache key of the CDS specs sharing a (start, end, strand) region"""
+    start, end, strand = region
+    key_data = {
+        "version": CACHE_FORMAT_VERSION,
+        "sequence": sequence[start:end],
+        "strand": strand,
+        "specs": sorted(
+            (_spec_key_data(spec) for spec in specs),
+            key=lambda data: json.dumps(data, sort_keys=True)
+        ),
+    }
+    encoded = json.dumps(key_data, sort_keys=True).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+def encode_choices(choices: List[Tuple[int, int, List[str]]]) -> Dict[str, np.ndarray]:
+    """Pack (start, end, variants) choices into flat arrays.
+
+    Every variant of a choice spans end - start nucleotides, so the variants
+    are stored back to back in a single uint8 buffer.
+    """
+    segments = np.array([(start, end) for start, end, _ in choices], dtype=np.int32)
+    counts = np.array([len(variants) for _, _, variants in choices], dtype=np.int32)
+    joined = "".join("".join(variants) for _, _, variants in choices)
+    return {
+        "segments": segments.reshape(-1, 2),
+        "variant_counts": counts,
+        "variants": np.frombuffer(joined.encode(), dtype=np.uint8),
+    }
+
+def decode_choices(
+    arrays: Dict[str, np.ndarray],
+    region_length: Optional[int] = None
+) -> List[Tuple[int, int, List[str]]]:
+    """Unpack choices packed by encode_choices.
+
+    Raises a ValueError if the arrays are inconsistent, contain anything else
+    than A, C, G, T, or (when region_length is given) have segments outside
+    of [0, region_length).
+    """
+    segments = arrays["segments"]
+    counts = arrays["variant_counts"]
+    if segments.ndim != 2 or segments.shape[1] != 2 or counts.shape != (len(segments),):
+        raise ValueError("segments and variant counts do not match")
+    starts, ends = segments[:, 0].astype(np.int64), segments[:, 1].astype(np.int64)
+    if np.any(starts < 0) or np.any(ends <= starts) or np.any(counts < 0):
+        raise ValueError("invalid segments or variant counts")
+    if region_length is not None and np.any(ends > region_length):
+        raise ValueError("segments run outside of the region")
+    expected_size = int((counts.astype(np.int64) * (ends - starts)).sum())
+    if arrays["variants"].size != expected_size:
+        raise ValueError("variant buffer length does not match the segments")
+    buffer = arrays["variants"].tobytes().decode("ascii")
+    if set(buffer) - set("ACGT"):
+        raise ValueError("variants contain non-ACGT characters")
+    choices = []
+    offset = 0
+    for (start, end), count in zip(arrays["segments"].tolist(), arrays["variant_counts"].tolist()):
+        length = end - start
+        variants = [
+            buffer[offset + i * length: offset + (i + 1) * length]
+            for i in range(count)
+        ]
+        offset += count * length
+        choices.append((start, end, variants))
+    return choices
+
+def _load_choices(key: str, region_length: int) -> Optional[List[Tuple[int, int, List[str]]]]:
+    """Return the cached choices for this key, or None on a cache miss.
+
+    Entries which fail validation are treated as misses.
+    """
+    path = os.path.join(CACHE_DIR, key + ".npz")
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            choices = decode_choices(dict(data), region_length=region_length)
+        # Mark the file as recently used for eviction
+        os.utime(path)
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable mutation space cache file {path}: {str(e)}")
+        return None
+    return choices
+
+def _evict_old_entries():
+    """Delete least recently used cache files until the cache fits CACHE_MAX_BYTES"""
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".npz"):
+            continue
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= CACHE_MAX_BYTES:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
+
+def _store_choices(key: str, choices: List[Tuple[int, int, List[str]]]):
+    """Save choices on disk (best effort)"""
+    tmp_path = None
+    try:
+        # Private directory: loaded entries directly restrict the allowed codons
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **encode_choices(choices))
+        # Atomic rename so concurrent jobs never read a partial file
+        os.replace(tmp_path, os.path.join(CACHE_DIR, key + ".npz"))
+        tmp_path = None
+        _evict_old_entries()
+    except Exception as e:
+        print(f"Warning: Could not write mutation space cache: {str(e)}")
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def _compute_region_choices(
+    sequence: str,
+    region: Tuple[int, int, int],
+    specs: List[Any]
+) -> List[Tuple[int, int, List[str]]]:
+    """Merge the restrictions of the region's specs, relative to the region start"""
+    start, end, _ = region
+    space = MutationSpace.from_optimization_problem(
+        SimpleNamespace(sequence=sequence, constraints=specs)
+    )
+    return [
+        (choice.start - start, choice.end - start, sorted(choice.variants))
+        for choice in space.choices_list
+        if not choice.is_any_nucleotide and start <= choice.start and choice.end <= end
+    ]
+
+def _cds_region(constraint) -> Optional[Tuple[int, int, int]]:
+    """Return the (start, end, strand) region of a CDS spec, or None if it can't be cached.
+
+    Locations given as plain tuples get strand +1 in EnforceTranslation but
+    strand 0 in AvoidRareCodons, so both are normalized to +1 here.
+    """
+    location = constraint.location
+    if (location.end - location.start) % 3:
+        # Ragged locations restrict a codon running past the location end
+        return None
+    strand = -1 if location.strand == -1 else 1
+    return (location.start, location.end, strand)
+
+def _group_cds_constraints(constraints: List[Any]) -> Tuple[Dict[Tuple[int, int, int], List[Any]], List[Any]]:
+    """Split constraints into non-overlapping CDS regions and everything else"""
+    groups: Dict[Tuple[int, int, int], List[Any]] = {}
+    others = []
+    for constraint in constraints:
+        region = _cds_region(constraint) if isinstance(constraint, CDS_SPEC_TYPES) else None
+        if region is not None:
+            groups.setdefault(region, []).append(constraint)
+        else:
+            others.append(constraint)
+
+    # Overlapping CDS regions cannot be pasted side by side, so the extra
+    # ones are merged in with the other constraints
+    kept = {}
+    last_end = None
+    for region in sorted(groups):
+        if last_end is not None and region[0] < last_end:
+            others.extend(groups[region])
+        else:
+            kept[region] = groups[region]
+            last_end = region[1]
+    return kept, others
+
+def has_cds_constraints(constraints: List[Any]) -> bool:
+    """Return whether some constraints can use the mutation space cache"""
+    return any(isinstance(c, CDS_SPEC_TYPES) for c in constraints)
+
+def create_cached_problem(sequence: str, constraints: List[Any], objectives: List[Any]) -> DnaOptimizationProblem:
+    """
+    Create a DnaOptimizationProblem, reusing cached CDS mutation choices
+
+    Args:
+        sequence: The DNA sequence to optimize
+        constraints: List of constraint objects
+        objectives: List of objective objects
+
+    Returns:
+        A problem equivalent to DnaOptimizationProblem(sequence, constraints, objectives)
+    """
+    # Passing a placeholder mutation space makes DNAChisel skip building it,
+    # while still initializing the specs (locations, translations) on the problem
+    problem = DnaOptimizationProblem(
+        sequence=sequence,
+        constraints=constraints,
+        objectives=objectives,
+        mutation_space=MutationSpace([])
+    )
+    sequence = problem.sequence
+    groups, others = _group_cds_constraints(problem.constraints)
+
+    variants = {"A": "ATGC", "T": "TACG", "G": "GCAT", "C": "CGTA"}
+    choices_index = [
+        MutationChoice((i, i + 1), variants=variants[c], is_any_nucleotide=True)
+        for i, c in enumerate(sequence)
+    ]
+    hits = 0
+    for region, specs in groups.items():
+        key = region_cache_key(sequence, region, specs)
+        choices = _load_choices(key, region[1] - region[0])
+        if choices is None:
+            choices = _compute_region_choices(sequence, region, specs)
+            _store_choices(key, choices)
+        else:
+            hits += 1
+        region_start = region[0]
+        for start, end, choice_variants in choices:
+            choice = MutationChoice(
+                (region_start + start, region_start + end), set(choice_variants)
+            )
+            for i in range(choice.start, choice.end):
+                choices_index[i] = choice
+    uncached = sum(isinstance(c, CDS_SPEC_TYPES) for c in others)
+    print(
+        f"Mutation space cache: {hits}/{len(groups)} CDS regions reused, "
+        f"{uncached} CDS specs merged without cache"
+    )
+
+    # Merge the remaining constraints on top of the cached CDS choices
+    problem.mutation_space = MutationSpace(choices_index)
+    problem.mutation_space = MutationSpace.from_optimization_problem(
+        problem, new_constraints=others
+    )
+    problem.sequence = problem.mutation_space.constrain_sequence(problem.sequence)
+    return problem